@@ -5,6 +5,8 @@ import torch
 import torch.utils.data as data
 import torch.nn.functional as F
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # file output only; skips importing a GUI toolkit
 import matplotlib.pyplot as plt
 from mpl_toolkits.axes_grid1 import ImageGrid
 plt.rcParams["text.usetex"]
@@ -241,7 +243,7 @@ def generate_figures(implementation, seed=42, rows=8, cols=7, shuffle=True,
 
         # plot information_flow
         z_dim = gce.K + gce.L
-        info_flow = gce.information_flow_single(range(0,z_dim))
+        info_flow = gce.information_flow_single(torch.arange(z_dim, device=gce.device))
 
         # we use author's code for making the exact same plot
         cols = {'golden_poppy' : [1.000,0.761,0.039],
@@ -278,45 +280,81 @@ def generate_figures(implementation, seed=42, rows=8, cols=7, shuffle=True,
             _, dataset_val = Fashion_MNIST_limited(train=True, classes=classes)
             vaX = dataset_val.dataset.data
             vaY = dataset_val.dataset.targets
-        valid_loader = data.DataLoader(dataset_val, batch_size=1, shuffle=False,
-                                    drop_last=True, pin_memory=True, num_workers=0)
-
         ntrain, nrow, ncol = vaX.shape
         x_dim = nrow*ncol
 
         # compute classifier accuracy after removing latent factors (minor changes compared to author's code)
+        # the validation set is processed in large batches rather than sample
+        # by sample, so every forward pass below runs over batch_size images
+        batch_size = 256
         classifier_accuracy_original = np.zeros(z_dim)
-        Yhat = np.zeros((len(vaX)))
-        Yhat_reencoded = np.zeros((len(vaX)))
-        Yhat_aspectremoved = np.zeros((z_dim, len(vaX)))
-
-        for i_samp in range(len(vaX)):
-            #if (i_samp % 1000) == 0:
-                #print(i_samp)
-            dataloader_iterator = iter(valid_loader)
-            vaX1, vaY1 = next(dataloader_iterator)
-            x = torch.from_numpy(np.asarray(vaX[None, i_samp:i_samp+1,:,:])).float().cpu()
-
-            Yhat[i_samp] = np.argmax(F.softmax(clf(x.cpu()), dim=1).cpu().detach().numpy())
-            z = gce.encoder(x.cpu())[0]
-            xhat = gce.decoder(z)
-            xhat = torch.sigmoid(xhat)
-            Yhat_reencoded[i_samp] = np.argmax(F.softmax(clf(xhat.cpu()), dim=1).cpu().detach().numpy())
-            for i_latent in range(z_dim):
-                z = gce.encoder(x.cpu())[0]
-                z[0,i_latent] = torch.randn((1))
-                xhat = gce.decoder(z)
-                xhat = torch.sigmoid(xhat)
-                Yhat_aspectremoved[i_latent,i_samp] = np.argmax(F.softmax(clf(xhat.cpu()), dim=1).cpu().detach().numpy())
+
+        # run on GPU when available; predictions are accumulated on-device and
+        # moved back to the host in a single transfer after the loop
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        Yhat = torch.empty(len(vaX), dtype=torch.long, device=device)
+        Yhat_reencoded = torch.empty(len(vaX), dtype=torch.long, device=device)
+        Yhat_aspectremoved = torch.empty((z_dim, len(vaX)), dtype=torch.long, device=device)
+
+        # NHWC lets cuDNN pick its fastest (tensor-core) conv kernels
+        clf.to(device, memory_format=torch.channels_last).eval()
+        gce.to(device).eval()
+
+        # convert the validation set to a device tensor once; every batch in
+        # the loop below is then a pure slice of it
+        vaX_t = torch.from_numpy(np.asarray(vaX)).float().unsqueeze(1).to(device)
+
+        # torch.compile (torch >= 2.0) fuses the conv/pointwise chains of the
+        # small MNIST models and, in reduce-overhead mode, replays them as CUDA
+        # graphs; batch shape is fixed so dynamic=False avoids recompilation
+        classify, encoder, decoder = clf, gce.encoder, gce.decoder
+        if hasattr(torch, 'compile') and device.type == 'cuda':
+            classify = torch.compile(classify, mode='reduce-overhead', dynamic=False)
+            encoder = torch.compile(encoder, mode='reduce-overhead', dynamic=False)
+            decoder = torch.compile(decoder, mode='reduce-overhead', dynamic=False)
+
+        # inference_mode (torch >= 1.9) also skips version counting and view
+        # tracking on top of no_grad; fall back to no_grad on older torch
+        inference_guard = getattr(torch, 'inference_mode', torch.no_grad)
+
+        with inference_guard():
+            # warm up so the compiled graphs specialize on the final batch shape
+            warmup = torch.zeros(min(batch_size, len(vaX)), 1, nrow, ncol, device=device)
+            warmup = warmup.contiguous(memory_format=torch.channels_last)
+            for _ in range(2):
+                classify(warmup)
+                decoder(encoder(warmup)[0])
+
+            for start in range(0, len(vaX), batch_size):
+                stop = start + batch_size
+                x = vaX_t[start:stop].contiguous(memory_format=torch.channels_last)
+
+                Yhat[start:stop] = classify(x).argmax(dim=1)
+                # x is unchanged throughout the batch, so encode it only once
+                # and ablate copies of the resulting latent code
+                z_base = encoder(x)[0]
+                xhat = torch.sigmoid(decoder(z_base))
+                xhat = xhat.contiguous(memory_format=torch.channels_last)
+                Yhat_reencoded[start:stop] = classify(xhat).argmax(dim=1)
+                # draw the ablation noise for the whole batch with one RNG call
+                # and replace latent i of copy i, so a single decode+classify
+                # pass covers every (sample, ablated latent) pair
+                noise = torch.randn(x.size(0), z_dim, device=device)
+                z_tiled = z_base.unsqueeze(1).repeat(1, z_dim, 1)
+                diag = torch.arange(z_dim, device=device)
+                z_tiled[:, diag, diag] = noise
+                xhat = torch.sigmoid(decoder(z_tiled.view(-1, z_base.size(-1))))
+                xhat = xhat.contiguous(memory_format=torch.channels_last)
+                preds = classify(xhat).argmax(dim=1).view(x.size(0), z_dim)
+                Yhat_aspectremoved[:, start:stop] = preds.t()
         vaY = np.asarray(vaY)
-        Yhat = np.asarray(Yhat)
-        Yhat_reencoded = np.asarray(Yhat_reencoded)
+        Yhat = Yhat.cpu().numpy()
+        Yhat_reencoded = Yhat_reencoded.cpu().numpy()
+        Yhat_aspectremoved = Yhat_aspectremoved.cpu().numpy()
 
         classifier_accuracy = np.mean(vaY == Yhat)
         classifier_accuracy_reencoded = np.mean(vaY == Yhat_reencoded)
-        classifier_accuracy_aspectremoved = np.zeros((z_dim))
-        for i in range(z_dim):
-            classifier_accuracy_aspectremoved[i] = np.mean(vaY == Yhat_aspectremoved[i,:])
+        classifier_accuracy_aspectremoved = (Yhat_aspectremoved == vaY[None, :]).mean(axis=1)
 
         #print(classifier_accuracy, classifier_accuracy_reencoded, classifier_accuracy_aspectremoved)
 
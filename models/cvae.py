@@ -5,7 +5,7 @@ import pytorch_lightning as pl
 from models.mnist_cnn import MNIST_CNN
 from utils.reproducibility import load_latest
 from utils.vae_loss import sample_reparameterize, ELBO, ELBO_to_BPD
-from utils.information_flow import CVAE_to_params, joint_uncond, joint_uncond_singledim
+from utils.information_flow import CVAE_to_params, joint_uncond, joint_uncond_singledim_batch
 import numpy as np
 
 class CNN_Encoder(nn.Module):
@@ -208,12 +208,8 @@ class MNIST_CVAE(pl.LightningModule):
         return C
 
     def information_flow_single(self, dims):
-        ndims = len(dims)
-        Is = np.zeros(ndims)
-        for (i, dim) in enumerate(dims):
-            negI, _ = joint_uncond_singledim(*CVAE_to_params(self), dim)
-            Is[i] = -1 * negI
-        return Is
+        negIs = joint_uncond_singledim_batch(*CVAE_to_params(self), dims)
+        return (-negIs).detach().cpu().numpy()
 
     def configure_optimizers(self):
 
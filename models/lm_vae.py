@@ -1,5 +1,6 @@
 import math
 import time
+from contextlib import nullcontext
 
 import numpy
 import torch
@@ -20,9 +21,15 @@ class LSTM_Encoder(nn.Module):
         self.hidden_dims = hidden_dims
         self.embedding_dims = embedding_dims
 
-        padding_idx = vocab['<pad>']
-        self.embed = nn.Embedding(len(vocab), self.embedding_dims,
-                                  padding_idx=padding_idx)
+        # plain-int copies of the special ids, so the hot loops do not go
+        # through the vocab's __getitem__/__len__ every step
+        self.vocab_size = len(vocab)
+        self.bos_id = vocab['<s>']
+        self.eos_id = vocab['</s>']
+        self.pad_id = vocab['<pad>']
+
+        self.embed = nn.Embedding(self.vocab_size, self.embedding_dims,
+                                  padding_idx=self.pad_id)
 
         self.lstm = nn.LSTM(input_size=self.embedding_dims,
                             hidden_size=self.hidden_dims,
@@ -39,8 +46,11 @@ class LSTM_Encoder(nn.Module):
         return next(self.parameters()).device
 
     def reset_parameters(self, std=0.01):
-        for param in self.parameters():
-            nn.init.uniform_(param, -std, std)
+        # one uniform_ over a flat view instead of a kernel per parameter;
+        # the embedding's wider 10*std range is redrawn on top
+        vec = nn.utils.parameters_to_vector(self.parameters())
+        vec.uniform_(-std, std)
+        nn.utils.vector_to_parameters(vec, self.parameters())
         nn.init.uniform_(self.embed.weight, -std * 10, std * 10)
 
     def forward(self, input):
@@ -69,18 +79,18 @@ class LSTM_Encoder(nn.Module):
             mean, logstd = stats
 
         logvar = 2 * logstd
+        logvar_sum = logvar.sum(-1)
 
         x_batch, z_dim = mean.shape[1], mean.shape[2]
         z_batch = x_batch * z_iters
 
         # E_{q(z|x)}log(q(z|x)) = -0.5*(K+L)*log(2*\pi) - 0.5*(1+logvar).sum(-1)
-        neg_entropy = (-0.5 * z_dim * math.log(2 * math.pi) - 0.5 * (1 + logvar).sum(-1)).mean()
+        neg_entropy = (-0.5 * z_dim * math.log(2 * math.pi) - 0.5 * (z_dim + logvar_sum)).mean()
 
-        # [z_batch, 1, z_dim]
-        z_samples = []
-        for i in range(z_iters):
-            z_samples.append(sample_reparameterize(mean, logstd).permute(1, 0, 2))
-        z_samples = torch.cat(z_samples, dim=0)
+        # [z_batch, 1, z_dim]: all z_iters sample sets drawn with one RNG call
+        eps = torch.randn((z_iters,) + mean.shape, device=mean.device)
+        z_samples = mean.unsqueeze(0) + eps * logstd.exp().unsqueeze(0)
+        z_samples = z_samples.permute(0, 2, 1, 3).reshape(z_batch, 1, z_dim)
         if debug:
             print('[z_batch, 1, z_dim]', z_samples.shape)
 
@@ -89,20 +99,49 @@ class LSTM_Encoder(nn.Module):
         if debug:
             print('[1, x_batch, z_dim]', mean.shape)
 
-        # (z_batch, x_batch)
-        log_density = -0.5 * (((z_samples - mean) ** 2) / var).sum(dim=-1) - \
-            0.5 * (z_dim * math.log(2 * math.pi) + logvar.sum(-1))
+        # (z_batch, x_batch), filled in x_batch chunks so the broadcasted
+        # (z_batch, chunk, z_dim) difference tensor stays small; the full
+        # (z_batch, x_batch, z_dim) intermediate is never materialized
+        chunk = 512
+        log_density = torch.empty((z_batch, x_batch), device=mean.device)
+        for j in range(0, x_batch, chunk):
+            diff = (z_samples - mean[:, j:j + chunk]).pow_(2).div_(var[:, j:j + chunk])
+            log_density[:, j:j + chunk] = -0.5 * diff.sum(dim=-1) - \
+                0.5 * (z_dim * math.log(2 * math.pi) + logvar_sum[:, j:j + chunk])
         if debug:
             print('(z_batch, x_batch)', log_density.shape)
 
         # log q(z): aggregate posterior
         # [z_batch]
-        log_qz = log_sum_exp(log_density, dim=1) - math.log(x_batch)
+        log_qz = torch.logsumexp(log_density, dim=1) - math.log(x_batch)
         if debug:
             print('[z_batch]', log_qz.shape)
 
         return (neg_entropy - log_qz.mean(-1)).detach()
 
+class _DecodeStep(nn.Module):
+    """Scriptable copy of the decoder's per-step computation.
+
+    LSTM_Decoder itself cannot be scripted (the vocab attribute is an
+    arbitrary Python object), so this wrapper shares the embedding and
+    output projection and inlines the premul cell, giving
+    torch.jit.optimize_for_inference a closed graph to freeze: the linear
+    weights are const-folded and the step runs without Python overhead.
+    """
+
+    def __init__(self, decoder):
+        super().__init__()
+        self.embed = decoder.embed
+        self.linear_out = decoder.linear_out
+
+    def forward(self, tokens, step_bias, h, c, w_emb_t, w_hh_t):
+        x_proj = torch.addmm(step_bias, self.embed(tokens), w_emb_t)
+        gates = torch.addmm(x_proj, h, w_hh_t)
+        in_gate, forget_gate, cell_gate, out_gate = gates.chunk(4, dim=1)
+        c = torch.sigmoid(forget_gate) * c + torch.sigmoid(in_gate) * torch.tanh(cell_gate)
+        h = torch.sigmoid(out_gate) * torch.tanh(c)
+        return self.linear_out(h), h, c
+
 class LSTM_Decoder(nn.Module):
 
     def __init__(self, vocab, embedding_dims, hidden_dims, latent_dims):
@@ -113,11 +152,16 @@ class LSTM_Decoder(nn.Module):
         self.embedding_dims = embedding_dims
         self.hidden_dims = hidden_dims
 
+        # see LSTM_Encoder: special ids cached as plain ints for the loops
+        self.vocab_size = len(vocab)
+        self.bos_id = vocab['<s>']
+        self.eos_id = vocab['</s>']
+        self.pad_id = vocab['<pad>']
+
         self.linear_in = nn.Linear(self.latent_dims, self.hidden_dims)
 
-        padding_idx = vocab['<pad>']
-        self.embed = nn.Embedding(len(vocab), embedding_dims,
-                                  padding_idx=padding_idx)
+        self.embed = nn.Embedding(self.vocab_size, embedding_dims,
+                                  padding_idx=self.pad_id)
 
         self.dropout_in = nn.Dropout(p=0.5)
 
@@ -128,19 +172,76 @@ class LSTM_Decoder(nn.Module):
                             batch_first=False)
 
         self.dropout_out = nn.Dropout(p=0.5)
-        self.linear_out = nn.Linear(self.hidden_dims, len(vocab))
+        self.linear_out = nn.Linear(self.hidden_dims, self.vocab_size)
 
         self.reset_parameters(std=0.01)
 
+        self._compiled_step = None
+        self._frozen_step = None
+        self._bos_cache = None
+
+    def _bos_embed(self):
+        """Cached (1, embedding_dims) view of the '<s>' embedding row. Being
+        a view of the live weight it tracks in-place updates; it is only
+        rebuilt when the module moves to another device.
+        """
+        cache = self._bos_cache
+        if cache is None or cache.device != self.embed.weight.device:
+            self._bos_cache = cache = self.embed.weight[self.bos_id].detach().unsqueeze(0)
+        return cache
+
+    def train(self, mode=True):
+        # the frozen inference graph bakes the weights in as constants, so it
+        # must be dropped whenever the module can train again
+        if mode:
+            self._frozen_step = None
+        return super().train(mode)
+
     @property
     def device(self):
         return next(self.parameters()).device
 
     def reset_parameters(self, std=0.01):
-        for param in self.parameters():
-            nn.init.uniform_(param, -std, std)
+        # one uniform_ over a flat view instead of a kernel per parameter;
+        # the embedding's wider 10*std range is redrawn on top
+        vec = nn.utils.parameters_to_vector(self.parameters())
+        vec.uniform_(-std, std)
+        nn.utils.vector_to_parameters(vec, self.parameters())
         nn.init.uniform_(self.embed.weight, -std * 10, std * 10)
 
+    def _decode_step(self, tokens, step_bias, h, c, w_emb_t, w_hh_t):
+        """One decoding step: embed the tokens, run the premul LSTM cell and
+        project to vocabulary logits. Weights are passed in as arguments so
+        the compiled version never captures stale parameters.
+        Returns: Tensor, Tensor, Tensor
+            the (batch_size, vocab_size) logits and the new hidden/cell state
+        """
+        x_proj = torch.addmm(step_bias, self.embed(tokens), w_emb_t)
+        h, c = lstm_premul_step(x_proj, h, c, w_hh_t)
+        return self.linear_out(h), h, c
+
+    def _get_decode_step(self):
+        """The per-step decode function. On CUDA with a PyTorch 2 build it is
+        compiled lazily with torch.compile so the whole step (embedding,
+        cell, output projection) is captured as one CUDA graph. Otherwise,
+        in eval mode, a scripted _DecodeStep frozen with
+        torch.jit.optimize_for_inference is used; the plain eager step is
+        the training-mode fallback.
+        """
+        if hasattr(torch, 'compile') and self.device.type == 'cuda':
+            if self._compiled_step is None:
+                self._compiled_step = torch.compile(
+                    self._decode_step, mode='reduce-overhead', dynamic=False)
+            return self._compiled_step
+
+        if self.training or not hasattr(torch.jit, 'optimize_for_inference'):
+            return self._decode_step
+
+        if self._frozen_step is None:
+            self._frozen_step = torch.jit.optimize_for_inference(
+                torch.jit.script(_DecodeStep(self).eval()))
+        return self._frozen_step
+
     def forward(self, z, input=None, debug=False):
         """
         Args:
@@ -161,18 +262,25 @@ class LSTM_Decoder(nn.Module):
 
             word_embed = self.dropout_in(word_embed)
 
-            z_ = z.expand(seq_len, batch_size, z_dim)
-
-            # (seq_len, batch_size, embedding_dim + z_dim)
-            word_embed = torch.cat((word_embed, z_), dim=-1)
-            if debug:
-                print('(seq_len, batch_size, embedding_dim + z_dim)', word_embed.shape)
-
             z = z.view(batch_size, z_dim)
-            c_init = self.linear_in(z).unsqueeze(0)
+            c_init = self.linear_in(z)
             h_init = torch.tanh(c_init)
 
-            output, _ = self.lstm(word_embed, (h_init, c_init))
+            # z is constant over the sequence, so its slice of the input
+            # weights and both biases fold into one per-batch term and the
+            # embeddings are projected in a single sequence-wide GEMM; no
+            # (seq_len, batch_size, embedding_dim + z_dim) buffer is built
+            w_ih = self.lstm.weight_ih_l0
+            w_emb_t = w_ih[:, :self.embedding_dims].t().contiguous()
+            w_hh_t = self.lstm.weight_hh_l0.t().contiguous()
+            step_bias = torch.addmm(self.lstm.bias_ih_l0 + self.lstm.bias_hh_l0,
+                                    z, w_ih[:, self.embedding_dims:].t())
+
+            x_proj = torch.matmul(word_embed, w_emb_t) + step_bias
+            if debug:
+                print('(seq_len, batch_size, 4 * hidden_dim)', x_proj.shape)
+
+            output, _, _ = lstm_premul_loop(x_proj, h_init, c_init, w_hh_t)
 
             output = self.dropout_out(output)
             if debug:
@@ -183,45 +291,64 @@ class LSTM_Decoder(nn.Module):
 
             seq_len = 81
 
-            input = torch.full(size=(1, z.size(0)),
-                               fill_value=self.vocab['<s>'],
-                               dtype=torch.long, device=self.device)
-
             z = z.view(batch_size, z_dim)
-            c = self.linear_in(z).unsqueeze(0)
+            c = self.linear_in(z)
             h = torch.tanh(c)
 
+            # z is constant over the loop, so its slice of the input weights
+            # and both biases are folded into one per-batch term; each step
+            # then only projects the token embedding (see greedy_decode)
+            w_ih = self.lstm.weight_ih_l0
+            w_emb_t = w_ih[:, :self.embedding_dims].t().contiguous()
+            w_hh_t = self.lstm.weight_hh_l0.t().contiguous()
+            step_bias = torch.addmm(self.lstm.bias_ih_l0 + self.lstm.bias_hh_l0,
+                                    z, w_ih[:, self.embedding_dims:].t())
+
+            # step 0 is always <s> for the whole batch: reuse one embedding
+            # row instead of a batch-wide lookup. The detached cache is only
+            # safe without gradients — lm_gce backprops through this branch
+            # into the embedding — so keep a live row otherwise. Dropout is
+            # only dispatched while training; in eval it is identity anyway
+            # but would still cost a kernel launch per step.
+            if torch.is_grad_enabled():
+                word_embed = self.embed.weight[self.bos_id].unsqueeze(0).expand(batch_size, -1)
+            else:
+                word_embed = self._bos_embed().expand(batch_size, -1)
+
             output_logits = []
             for t in range(seq_len):
-                # (1, batch_size, embedding_dim)
-                word_embed = self.embed(input)
-                word_embed = self.dropout_in(word_embed)
+                if self.training:
+                    word_embed = self.dropout_in(word_embed)
 
-                # (1, batch_size, embedding_dim + hidden_dim)
-                word_embed = torch.cat((word_embed, z.unsqueeze(0)), dim=-1)
+                # (batch_size, hidden_dim)
+                x_proj = torch.addmm(step_bias, word_embed, w_emb_t)
+                h, c = lstm_premul_step(x_proj, h, c, w_hh_t)
+                output = self.dropout_out(h) if self.training else h
 
-                # (1, batch_size, hidden_dim)
-                output, (h, c) = self.lstm(word_embed, (h, c))
-                output = self.dropout_out(output)
-
-                # (1, batch_size, vocab_size)
+                # (batch_size, vocab_size)
                 logits_t = self.linear_out(output)
 
-                # (1, batch_size)
-                input = torch.argmax(logits_t, dim=-1)
+                # (batch_size, embedding_dim) for the next step
+                word_embed = self.embed(torch.argmax(logits_t, dim=-1))
 
                 output_logits.append(logits_t)
 
             # (seq_len, batch_size, vocab_size)
-            output_logits = torch.cat(output_logits, dim=0)
+            output_logits = torch.stack(output_logits, dim=0)
 
         return output_logits
 
     @torch.no_grad()
     def beam_search_decode(self, z, K=5, max_length=30):
-        """beam search decoding, code is based on
-        https://github.com/pcyin/pytorch_basic_nmt/blob/master/nmt.py
-        the current implementation decodes sentence one by one, further batching would improve the speed
+        """beam search decoding, batched over both sentences and beams
+        All batch_size * K live hypotheses go through a single LSTM step per
+        timestep; the per-sentence top-K selection happens on the
+        (batch_size, K * vocab_size) score tensor in one topk call. Hypotheses
+        that produced </s> are frozen: their score stays fixed and they can
+        only re-emit </s>, so they keep competing with the live ones without
+        being expanded. Once all K beams of a sentence are finished the
+        sentence is evicted from the active batch, so late steps only pay for
+        the sentences that are still generating.
         Args:
             z: (batch_size, nz)
             K: the beam width
@@ -230,101 +357,117 @@ class LSTM_Decoder(nn.Module):
         """
 
         batch_size, nz = z.size()
-        decoded_batch = []  # [[] for _ in range(batch_size)]
-
-        # (1, batch_size, nz)
-        c_init = self.linear_in(z).unsqueeze(0)
-        h_init = torch.tanh(c_init)
-
-        # decoding goes sentence by sentence
-        for idx in range(batch_size):
-            # Start with the start of the sentence token
-            decoder_input = torch.tensor([[self.vocab["<s>"]]], dtype=torch.long, device=self.device)
-            decoder_hidden = (h_init[:, idx, :].unsqueeze(0), c_init[:, idx, :].unsqueeze(0))
-
-            node = BeamSearchNode(decoder_hidden, None, decoder_input, 0., 1)
-            live_hypotheses = [node]
-
-            completed_hypotheses = []
-
-            t = 0
-            while len(completed_hypotheses) < K and t < max_length:
-                t += 1
-
-                # (1, len(live))
-                decoder_input = torch.cat([node.wordid for node in live_hypotheses], dim=1)
-
-                # (1, len(live), nh)
-                decoder_hidden_h = torch.cat([node.h[0] for node in live_hypotheses], dim=1)
-                decoder_hidden_c = torch.cat([node.h[1] for node in live_hypotheses], dim=1)
-
-                decoder_hidden = (decoder_hidden_h, decoder_hidden_c)
-
-                # (1, len(live), ni) --> (1, len(live), ni+nz)
-                word_embed = self.embed(decoder_input)
-                word_embed = torch.cat((word_embed, z[idx].view(1, 1, -1).expand(
-                    1, len(live_hypotheses), nz)), dim=-1)
-
-                output, decoder_hidden = self.lstm(word_embed, decoder_hidden)
-
-                # (1, len(live), vocab_size)
-                output_logits = self.linear_out(output)
-                decoder_output = F.log_softmax(output_logits, dim=-1)
-
-                prev_logp = torch.tensor([node.logp for node in live_hypotheses], dtype=torch.float, device=self.device)
-                decoder_output = decoder_output + prev_logp.view(1, len(live_hypotheses), 1)
-
-                # (len(live) * vocab_size)
-                decoder_output = decoder_output.view(-1)
-
-                # (K)
-                log_prob, indexes = torch.topk(decoder_output, K - len(completed_hypotheses))
-
-                live_ids = indexes // len(self.vocab)
-                word_ids = indexes % len(self.vocab)
-
-                live_hypotheses_new = []
-                for live_id, word_id, log_prob_ in zip(live_ids, word_ids, log_prob):
-                    node = BeamSearchNode((decoder_hidden[0][:, live_id, :].unsqueeze(1),
-                                           decoder_hidden[1][:, live_id, :].unsqueeze(1)),
-                                          live_hypotheses[live_id], word_id.view(1, 1), log_prob_, t)
-
-                    if word_id.item() == self.vocab["</s>"]:
-                        completed_hypotheses.append(node)
-                    else:
-                        live_hypotheses_new.append(node)
-
-                live_hypotheses = live_hypotheses_new
-
-                if len(completed_hypotheses) == K:
+        vocab_size = self.vocab_size
+        end_id = self.eos_id
+
+        # every sentence is replicated K times: row b*K+k is beam k of sentence b
+        c = self.linear_in(z).repeat_interleave(K, dim=0)
+        h = torch.tanh(c)
+
+        # z is constant per row: fold its input projection and the biases
+        # into one per-row term instead of concatenating z every step
+        w_ih = self.lstm.weight_ih_l0
+        w_emb_t = w_ih[:, :self.embedding_dims].t().contiguous()
+        w_hh_t = self.lstm.weight_hh_l0.t().contiguous()
+        step_bias = torch.addmm(self.lstm.bias_ih_l0 + self.lstm.bias_hh_l0,
+                                z.repeat_interleave(K, dim=0),
+                                w_ih[:, self.embedding_dims:].t())
+
+        # only beam 0 starts live, so the identical copies cannot fill the topk
+        logp = torch.full((batch_size, K), float('-inf'), device=self.device)
+        logp[:, 0] = 0.
+        finished = torch.zeros((batch_size, K), dtype=torch.bool, device=self.device)
+
+        input = torch.full((batch_size * K,), self.bos_id,
+                           dtype=torch.long, device=self.device)
+
+        # active[i] is the original sentence id of active row i; evicted
+        # sentences are dropped from all per-row state tensors
+        active = torch.arange(batch_size, device=self.device)
+
+        # per step and sentence: emitted token and parent beam, scattered by
+        # original sentence id so eviction does not disturb the history
+        tokens_t = torch.zeros((max_length, batch_size, K), dtype=torch.long, device=self.device)
+        parents_t = torch.zeros((max_length, batch_size, K), dtype=torch.long, device=self.device)
+        steps = torch.full((batch_size,), max_length, dtype=torch.long, device=self.device)
+        best = torch.zeros(batch_size, dtype=torch.long, device=self.device)
+
+        for t in range(max_length):
+            A = active.size(0)
+
+            # (A*K, 4*nh)
+            x_proj = torch.addmm(step_bias, self.embed(input), w_emb_t)
+            h, c = lstm_premul_step(x_proj, h, c, w_hh_t)
+
+            # (A, K, vocab_size)
+            log_prob = F.log_softmax(self.linear_out(h), dim=-1)
+            scores = logp.unsqueeze(-1) + log_prob.view(A, K, vocab_size)
+
+            # frozen beams contribute exactly one candidate: </s> at their score
+            scores = scores.masked_fill(finished.unsqueeze(-1), float('-inf'))
+            scores[:, :, end_id] = torch.where(finished, logp, scores[:, :, end_id])
+
+            # (A, K) best continuations per sentence in one call
+            logp, indexes = torch.topk(scores.view(A, -1), K, dim=-1)
+            parent = indexes // vocab_size
+            word = indexes % vocab_size
+
+            finished = finished.gather(1, parent) | (word == end_id)
+
+            tokens_t[t, active] = word
+            parents_t[t, active] = parent
+
+            # evict sentences whose K beams are all finished
+            done = finished.all(dim=1)
+            if bool(done.any()):
+                steps[active[done]] = t + 1
+                best[active[done]] = logp[done].argmax(dim=-1)
+                if bool(done.all()):
+                    active = active[:0]
                     break
 
-            for live in live_hypotheses:
-                completed_hypotheses.append(live)
-
-            utterances = []
-            for n in sorted(completed_hypotheses, key=lambda node: node.logp, reverse=True):
-                utterance = []
-                utterance.append(self.vocab.itos[n.wordid.item()])
-                # back trace
-                while n.prevNode != None:
-                    n = n.prevNode
-                    token = self.vocab.itos[n.wordid.item()]
-                    if token != '<s>':
-                        utterance.append(self.vocab.itos[n.wordid.item()])
-                    else:
-                        break
-
-                utterance = utterance[::-1]
-
-                utterances.append(utterance)
-
-                # only save the top 1
-                break
-
-            decoded_batch.append(utterances[0])
-
-        decoded_batch = [' '.join(sent) for sent in decoded_batch]
+                keep = ~done
+                active = active[keep]
+                logp = logp[keep]
+                finished = finished[keep]
+                parent = parent[keep]
+                word = word[keep]
+                beam_keep = keep.unsqueeze(1).expand(A, K).reshape(-1)
+                step_bias = step_bias[beam_keep]
+                h = h[beam_keep]
+                c = c[beam_keep]
+                A = active.size(0)
+
+            # reorder hidden states to follow the selected parents
+            offsets = (torch.arange(A, device=self.device) * K).unsqueeze(1)
+            select = (offsets + parent).view(-1)
+            h = h.index_select(0, select)
+            c = c.index_select(0, select)
+            input = word.view(-1)
+
+        if active.size(0) > 0:
+            best[active] = logp.argmax(dim=-1)
+
+        # back-trace all sentences at once: one parent-pointer hop per step
+        # for the whole batch instead of a Python loop per sentence and token
+        tokens_t = tokens_t.cpu().numpy()
+        parents_t = parents_t.cpu().numpy()
+        steps = steps.cpu().numpy()
+        beam = best.cpu().numpy()
+
+        word_ids = np.zeros((max_length, batch_size), dtype=np.int64)
+        for t in range(max_length - 1, -1, -1):
+            live = steps > t
+            word_ids[t, live] = tokens_t[t, live, beam[live]]
+            beam[live] = parents_t[t, live, beam[live]]
+
+        decoded_batch = []
+        for idx in range(batch_size):
+            sent = word_ids[:steps[idx], idx]
+            ends = np.nonzero(sent == end_id)[0]
+            if len(ends) > 0:
+                sent = sent[:ends[0] + 1]
+            decoded_batch.append(' '.join(self.vocab.itos[w] for w in sent))
 
         return decoded_batch
 
@@ -338,45 +481,77 @@ class LSTM_Decoder(nn.Module):
         """
 
         batch_size, nz = z.size()
-        decoded_batch = [[] for _ in range(batch_size)]
+        tokens = []
 
-        # (1, batch_size, nz)
-        c_init = self.linear_in(z).unsqueeze(0)
-        h_init = torch.tanh(c_init)
+        # (batch_size, nh)
+        c = self.linear_in(z)
+        h = torch.tanh(c)
 
-        decoder_hidden = (h_init, c_init)
-        decoder_input = torch.tensor([self.vocab["<s>"]] * batch_size,
-                                     dtype=torch.long, device=self.device).unsqueeze(0)
-        end_symbol = torch.tensor([self.vocab["</s>"]] * batch_size, dtype=torch.long, device=self.device)
+        # z is constant across timesteps, so its share of the LSTM input
+        # projection (plus both biases) is folded into one per-batch term;
+        # each step is then a single embedding GEMM, the scripted premul cell
+        # and the output projection
+        w_ih = self.lstm.weight_ih_l0
+        w_emb_t = w_ih[:, :self.embedding_dims].t().contiguous()
+        w_hh_t = self.lstm.weight_hh_l0.t().contiguous()
+        step_bias = torch.addmm(self.lstm.bias_ih_l0 + self.lstm.bias_hh_l0,
+                                z, w_ih[:, self.embedding_dims:].t())
 
-        mask = torch.ones((batch_size), dtype=torch.uint8, device=self.device)
-        length_c = 1
-        while mask.sum().item() != 0 and length_c < max_length:
+        decoder_input = torch.full((batch_size,), self.bos_id,
+                                   dtype=torch.long, device=self.device)
 
-            # (batch_size, 1, ni) --> (batch_size, 1, ni+nz)
-            word_embed = self.embed(decoder_input)
-            word_embed = word_embed.squeeze(2)
-            word_embed = torch.cat((word_embed, z.unsqueeze(0)), dim=-1)
+        decode_step = self._get_decode_step()
 
-            output, decoder_hidden = self.lstm(word_embed, decoder_hidden)
+        mask = torch.ones((batch_size), dtype=torch.bool, device=self.device)
+        for length_c in range(1, max_length):
 
-            # (batch_size, 1, vocab_size) --> (batch_size, vocab_size)
-            decoder_output = self.linear_out(output)
-            output_logits = decoder_output.squeeze(0)
+            # (batch_size, vocab_size), (batch_size, nh) x2
+            output_logits, h, c = decode_step(decoder_input, step_bias,
+                                              h, c, w_emb_t, w_hh_t)
 
             # (batch_size)
             max_index = torch.argmax(output_logits, dim=1)
 
-            decoder_input = max_index.unsqueeze(0)
-            length_c += 1
+            decoder_input = max_index
+
+            tokens.append(max_index)
+            mask = (max_index != self.eos_id) & mask
+            # any() is a single cheap reduction and the only sync per step
+            if not bool(mask.any()):
+                break
+
+        # one transfer for all steps; the per-sentence cut at the first </s>
+        # happens on host, so the loop above never leaves the GPU for lookups
+        decoded_batch = self.tokens_to_sentences(tokens, batch_size)
+
+        return decoded_batch
+
+    def tokens_to_sentences(self, tokens, batch_size):
+        """Turns a list of per-step token tensors into sentence strings.
+        Every sentence is cut after its first </s>, matching the old
+        incremental masking, but with a single device-to-host copy.
+        Args:
+            tokens: list of (batch_size,) token-id tensors, one per step
+        Returns: List1
+            List1: the decoded word sentence list
+        """
+
+        end_id = self.eos_id
 
-            for i in range(batch_size):
-                if mask[i].item():
-                    decoded_batch[i].append(self.vocab.itos[max_index[i].item()])
+        if len(tokens) == 0:
+            return [''] * batch_size
 
-            mask = (max_index != end_symbol) * mask
+        # (seq_len, batch_size)
+        tokens = torch.stack(tokens, dim=0).cpu().numpy()
 
-        decoded_batch = [' '.join(sent) for sent in decoded_batch]
+        decoded_batch = []
+        for i in range(batch_size):
+            sent = []
+            for word_id in tokens[:, i]:
+                sent.append(self.vocab.itos[word_id])
+                if word_id == end_id:
+                    break
+            decoded_batch.append(' '.join(sent))
 
         return decoded_batch
 
@@ -390,46 +565,47 @@ class LSTM_Decoder(nn.Module):
         """
 
         batch_size, nz = z.size()
-        decoded_batch = [[] for _ in range(batch_size)]
-
-        # (1, batch_size, nz)
-        c_init = self.linear_in(z).unsqueeze(0)
-        h_init = torch.tanh(c_init)
+        tokens = []
 
-        decoder_hidden = (h_init, c_init)
-        decoder_input = torch.tensor([self.vocab["<s>"]] * batch_size,
-                                     dtype=torch.long, device=self.device).unsqueeze(0)
-        end_symbol = torch.tensor([self.vocab["</s>"]] * batch_size, dtype=torch.long, device=self.device)
+        # (batch_size, nh)
+        c = self.linear_in(z)
+        h = torch.tanh(c)
 
-        mask = torch.ones((batch_size), dtype=torch.uint8, device=self.device)
-        length_c = 1
-        while mask.sum().item() != 0 and length_c < max_length:
+        # see greedy_decode: the z projection and biases are hoisted out of
+        # the loop, leaving one GEMM plus the scripted premul cell per step
+        w_ih = self.lstm.weight_ih_l0
+        w_emb_t = w_ih[:, :self.embedding_dims].t().contiguous()
+        w_hh_t = self.lstm.weight_hh_l0.t().contiguous()
+        step_bias = torch.addmm(self.lstm.bias_ih_l0 + self.lstm.bias_hh_l0,
+                                z, w_ih[:, self.embedding_dims:].t())
 
-            # (batch_size, 1, ni) --> (batch_size, 1, ni+nz)
-            word_embed = self.embed(decoder_input)
-            word_embed = word_embed.squeeze(2)
-            word_embed = torch.cat((word_embed, z.unsqueeze(0)), dim=-1)
+        decoder_input = torch.full((batch_size,), self.bos_id,
+                                   dtype=torch.long, device=self.device)
 
-            output, decoder_hidden = self.lstm(word_embed, decoder_hidden)
+        decode_step = self._get_decode_step()
 
-            # (batch_size, 1, vocab_size) --> (batch_size, vocab_size)
-            decoder_output = self.linear_out(output)
-            output_logits = decoder_output.squeeze(0)
+        mask = torch.ones((batch_size), dtype=torch.bool, device=self.device)
+        for length_c in range(1, max_length):
 
-            # (batch_size)
-            sample_prob = F.softmax(output_logits, dim=1)
-            sample_index = torch.multinomial(sample_prob, num_samples=1).squeeze()
+            # (batch_size, vocab_size), (batch_size, nh) x2
+            output_logits, h, c = decode_step(decoder_input, step_bias,
+                                              h, c, w_emb_t, w_hh_t)
 
-            decoder_input = sample_index.unsqueeze(0)
-            length_c += 1
+            # (batch_size): Gumbel-max sample, equivalent to multinomial over
+            # the softmax but just elementwise ops plus one argmax reduction
+            gumbel = -torch.log(-torch.log(torch.rand_like(output_logits).clamp_min_(1e-20)))
+            sample_index = (output_logits + gumbel).argmax(dim=1)
 
-            for i in range(batch_size):
-                if mask[i].item():
-                    decoded_batch[i].append(self.vocab.itos[sample_index[i].item()])
+            decoder_input = sample_index
 
-            mask = (sample_index != end_symbol) * mask
+            tokens.append(sample_index)
+            mask = (sample_index != self.eos_id) & mask
+            # see greedy_decode: any() instead of a sum().item() sync
+            if not bool(mask.any()):
+                break
 
-        decoded_batch = [' '.join(sent) for sent in decoded_batch]
+        # see greedy_decode: all itos lookups happen after the loop
+        decoded_batch = self.tokens_to_sentences(tokens, batch_size)
 
         return decoded_batch
 
@@ -469,27 +645,45 @@ class lm_VAE(pl.LightningModule):
                                     hidden_dims=self.hidden_dims,
                                     latent_dims=self.latent_dims)
 
-        vocab_mask = torch.ones(len(self.vocab))
-        self.loss_fn = nn.CrossEntropyLoss(weight=vocab_mask, reduction='none', ignore_index=self.vocab['<pad>'])
+        self.loss_fn = nn.CrossEntropyLoss(reduction='none', ignore_index=self.vocab['<pad>'])
 
         self.t0 = time.time()
 
+    def on_load_checkpoint(self, checkpoint):
+        # checkpoints saved while the loss still carried the all-ones class
+        # weight have a loss_fn.weight buffer; drop it so strict loading of
+        # older text-VAE artifacts keeps working
+        checkpoint['state_dict'].pop('loss_fn.weight', None)
+
+    def autocast(self):
+        """bf16 autocast context for the LSTM-heavy encoder/decoder passes.
+        bf16 keeps the fp32 exponent range, so only the losses need to stay
+        in full precision. A no-op on CPU or GPUs without bf16 support.
+        """
+        if hasattr(torch, 'autocast') and torch.cuda.is_available() \
+                and torch.cuda.is_bf16_supported():
+            return torch.autocast(device_type='cuda', dtype=torch.bfloat16)
+        return nullcontext()
+
     def forward(self, batch, calc_mi=False):
 
         text, _ = batch.text, batch.label
 
-        mean, log_std = self.encoder(text)
-
-        L_reg = KLD(mean, log_std)
+        with self.autocast():
+            mean, log_std = self.encoder(text)
+            # one fused kernel sweep yields the sample and the KLD together;
+            # fp32 inputs keep the loss out of bf16
+            z, L_reg = sample_reparameterize_KLD(mean.float(), log_std.float())
+            logits = self.decoder.forward(z, text[:-1])
 
-        z = sample_reparameterize(mean, log_std)
+        # losses in fp32: bf16 costs precision in log-softmax
+        mean, log_std, logits = mean.float(), log_std.float(), logits.float()
 
         target = text[1:]
-        logits = self.decoder.forward(z, text[:-1])
 
-        L_rec = self.loss_fn(logits.view(-1, logits.size(-1)),
-                             target.view(-1))
-        L_rec = torch.sum(L_rec.view(logits.size(1), -1), dim=-1)
+        L_rec = self.loss_fn(logits.reshape(-1, logits.size(-1)),
+                             target.reshape(-1))
+        L_rec = torch.sum(L_rec.reshape(logits.size(1), -1), dim=-1)
 
         if calc_mi:
             mi = self.encoder.MutualInformation(text,
@@ -554,8 +748,12 @@ class lm_VAE(pl.LightningModule):
         i=0
         if self.aggressive:
 
+            burn_sents_len, burn_batch_size = batch.text.size()
+            burn_words_per_iter = (burn_sents_len - 1) * burn_batch_size
             burn_num_words = 0
-            burn_pre_loss = 1e4
+            # a device scalar, so the checkpoint comparison below stays a
+            # tensor op instead of mixing in a Python float
+            burn_pre_loss = torch.full((), 1e4, device=self.device)
             burn_cur_loss = 0
             for i in range(1, self.inner_iter+1):
 
@@ -566,13 +764,14 @@ class lm_VAE(pl.LightningModule):
                 self.manual_backward(loss, encoder_opt)
                 encoder_opt.step()
 
-                self.log("Train - Inner ELBO", L_rec + L_reg)
-
-                burn_sents_len, burn_batch_size = batch.text.size()
-                burn_num_words += (burn_sents_len - 1) * burn_batch_size
-                burn_cur_loss += loss.sum().detach()
+                # stays a device tensor between checkpoints: no sync per step
+                burn_num_words += burn_words_per_iter
+                burn_cur_loss += loss.detach()
 
+                # checkpoint: log and evaluate the early-stopping criterion
+                # only every inner_iter//10 steps
                 if i % (self.inner_iter//10) == 0:
+                    self.log("Train - Inner ELBO", L_rec + L_reg)
                     burn_cur_loss = burn_cur_loss / burn_num_words
                     if burn_pre_loss - burn_cur_loss < 0:
                         self.log("Train - Inner Steps", i)
@@ -602,7 +801,7 @@ class lm_VAE(pl.LightningModule):
 
         self.kl_weight = min(1.0, self.kl_weight + self.anneal_rate)
 
-        if batch_idx == 0 or batch_idx % 5 == 0:
+        if batch_idx == 0 or batch_idx % 50 == 0:
             t1 = time.time()
             dt = (t1 - self.t0) / 60
             mins, secs = int(dt), int((dt - int(dt)) * 60)
@@ -649,19 +848,21 @@ class lm_VAE(pl.LightningModule):
     @torch.no_grad()
     def decode(self, text, decoding_strategy=None, beam_length=5):
 
-        mean, log_std = self.encoder(text)
-        z = sample_reparameterize(mean, log_std)
-        z = z.squeeze()
-
         if decoding_strategy == None:
             decoding_strategy = self.decoding_strategy
 
-        if decoding_strategy == 'beam_search':
-            text_sample = self.decoder.beam_search_decode(z, beam_length)
-        elif decoding_strategy == 'greedy':
-            text_sample = self.decoder.greedy_decode(z)
-        elif decoding_strategy == 'sample':
-            text_sample = self.decoder.sample_decode(z)
+        # no backward pass here, so bf16 is a pure bandwidth win
+        with self.autocast():
+            mean, log_std = self.encoder(text)
+            z = sample_reparameterize(mean, log_std)
+            z = z.squeeze()
+
+            if decoding_strategy == 'beam_search':
+                text_sample = self.decoder.beam_search_decode(z, beam_length)
+            elif decoding_strategy == 'greedy':
+                text_sample = self.decoder.greedy_decode(z)
+            elif decoding_strategy == 'sample':
+                text_sample = self.decoder.sample_decode(z)
 
         return text_sample
 
@@ -679,22 +880,19 @@ class lm_VAE(pl.LightningModule):
         mean, log_std = self.encoder(input.unsqueeze(1))
         z_init = sample_reparameterize(mean, log_std).squeeze()
 
-        vals = np.linspace(-3, 3, num=num)
-        sweep = []
-        for val in vals:
-            z_adj = z_init.clone()
-            z_adj[zi] += val
-
-            sweep.append(z_adj)
-
-        sweep = torch.stack(sweep, dim=0)
-
-        if decoding_strategy == 'beam_search':
-            text_sample = self.decoder.beam_search_decode(sweep, beam_length)
-        elif decoding_strategy == 'greedy':
-            text_sample = self.decoder.greedy_decode(sweep)
-        elif decoding_strategy == 'sample':
-            text_sample = self.decoder.sample_decode(sweep)
+        # one broadcast add instead of num clones and scalar transfers
+        vals_t = torch.linspace(-3, 3, num, device=z_init.device)
+        sweep = z_init.unsqueeze(0).repeat(num, 1)
+        sweep[:, zi] += vals_t
+        vals = vals_t.cpu().numpy()
+
+        with self.autocast():
+            if decoding_strategy == 'beam_search':
+                text_sample = self.decoder.beam_search_decode(sweep, beam_length)
+            elif decoding_strategy == 'greedy':
+                text_sample = self.decoder.greedy_decode(sweep)
+            elif decoding_strategy == 'sample':
+                text_sample = self.decoder.sample_decode(sweep)
 
         sweep_text = []
         for n, sent in enumerate(text_sample):
@@ -57,6 +57,45 @@ def joint_uncond(params, decoder, classifier, device, argmax=False):
     return negCausalEffect, info
 
 
+def joint_uncond_singledim_batch(params, decoder, classifier, device, dims, forward_batch=4096):
+    """Computes joint_uncond_singledim for every latent in `dims` at once.
+
+    Instead of Nalpha sequential decoder/classifier calls per dimension, all
+    (dim, alpha, beta) samples are built as one tensor and pushed through the
+    networks in a few large forward passes (chunked by `forward_batch` to
+    bound activation memory).
+
+    Returns:
+        negI : tensor of shape [len(dims)] with the negative information flow
+               per latent dimension.
+    """
+
+    eps = 1e-5
+    dims = torch.as_tensor(dims, dtype=torch.long, device=device)
+    ndims = dims.numel()
+    Nalpha, Nbeta, z_dim = params['Nalpha'], params['Nbeta'], params['z_dim']
+
+    zs = torch.randn(ndims, Nalpha, Nbeta, z_dim, device=device)
+    z_fix = torch.randn(ndims, Nalpha, 1, device=device)
+    zs.scatter_(3, dims.view(ndims, 1, 1, 1).expand(ndims, Nalpha, Nbeta, 1),
+                z_fix.unsqueeze(-1).expand(ndims, Nalpha, Nbeta, 1))
+
+    # decode and classify all samples in large batches
+    zs = zs.view(-1, z_dim)
+    yhats = []
+    for start in range(0, zs.size(0), forward_batch):
+        xhat = torch.sigmoid(decoder(zs[start:start + forward_batch]))
+        yhats.append(F.softmax(classifier(xhat), dim=1))
+    yhat = torch.cat(yhats, dim=0).view(ndims, Nalpha, Nbeta, -1)
+
+    p = yhat.mean(dim=2)  # estimate of p(y|alpha) per (dim, alpha)
+    I = torch.sum(torch.mul(p, torch.log(p + eps)), dim=-1).mean(dim=1)
+    q = p.mean(dim=1)     # estimate of p(y) per dim
+    I = I - torch.sum(torch.mul(q, torch.log(q + eps)), dim=-1)
+
+    return -I
+
+
 def joint_uncond_singledim(params, decoder, classifier, device, dims):
 
     eps = 1e-5
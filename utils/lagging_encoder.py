@@ -4,6 +4,8 @@ Useful functions for sampling and calculating loss of the aggressive trained tex
 Adapted from: https://github.com/jxhe/vae-lagging-encoder/blob/master/modules/utils.py
 """
 
+from typing import List
+
 import torch
 
 
@@ -23,6 +25,49 @@ def log_sum_exp(value, dim=None, keepdim=False):
         return m + torch.log(sum_exp)
 
 
+@torch.jit.script
+def lstm_premul_step(x_proj, h, c, weight_hh_t):
+    """One LSTM step whose input projection was already computed.
+
+    Caller precomputes x_proj = x @ W_ih^T + b_ih + b_hh (plus any term that
+    is constant across timesteps), so the step itself is one GEMM against the
+    recurrent weights and the gate pointwise ops, fused by the JIT.
+    Args:
+        x_proj: (batch_size, 4*nh) projected input
+        h, c: (batch_size, nh) previous hidden and cell state
+        weight_hh_t: (nh, 4*nh) transposed recurrent weight matrix
+    Returns: Tensor, Tensor
+        the new hidden and cell state, each (batch_size, nh)
+    """
+    gates = torch.addmm(x_proj, h, weight_hh_t)
+    in_gate, forget_gate, cell_gate, out_gate = gates.chunk(4, dim=1)
+    c = torch.sigmoid(forget_gate) * c + torch.sigmoid(in_gate) * torch.tanh(cell_gate)
+    h = torch.sigmoid(out_gate) * torch.tanh(c)
+    return h, c
+
+
+@torch.jit.script
+def lstm_premul_loop(x_proj, h, c, weight_hh_t):
+    """Full-sequence companion of lstm_premul_step.
+
+    Caller projects the whole input sequence in one GEMM (plus any term that
+    is constant across timesteps, folded into the bias); the loop then only
+    runs the recurrent GEMM and the fused gate pointwise ops per step.
+    Args:
+        x_proj: (seq_len, batch_size, 4*nh) projected input sequence
+        h, c: (batch_size, nh) initial hidden and cell state
+        weight_hh_t: (nh, 4*nh) transposed recurrent weight matrix
+    Returns: Tensor, Tensor, Tensor
+        the (seq_len, batch_size, nh) hidden states over the sequence and
+        the final hidden and cell state
+    """
+    outputs = torch.jit.annotate(List[torch.Tensor], [])
+    for t in range(x_proj.size(0)):
+        h, c = lstm_premul_step(x_proj[t], h, c, weight_hh_t)
+        outputs.append(h)
+    return torch.stack(outputs, dim=0), h, c
+
+
 def generate_grid(zmin, zmax, dz, device, ndim=2):
     """generate a 1- or 2-dimensional grid
     Returns: Tensor, int
@@ -29,6 +29,28 @@ def sample_reparameterize(mean, std):
     return z
 
 
+@torch.jit.script
+def sample_reparameterize_KLD(mean, log_std):
+    """
+    Fused reparameterization sample plus Kullback-Leibler divergence. Both read
+    the same (mean, log_std) pair, so computing them in one scripted function
+    halves the reads and lets the JIT fuse the elementwise chain.
+    Inputs:
+        mean - Tensor of arbitrary shape and range, denoting the mean of the distributions.
+        log_std - Tensor of arbitrary shape and range, denoting the log standard deviation
+                  of the distributions.
+    Outputs:
+        z - A sample of the distributions, same shape as mean, with gradient support.
+        kld - Tensor summed over the last dimension, the divergence to unit Gaussians.
+    """
+
+    log_var = 2 * log_std
+    z = torch.exp(log_std) * torch.randn_like(mean) + mean
+    kld = 0.5 * torch.sum(torch.exp(log_var) + mean ** 2 - 1 - log_var, dim=-1)
+
+    return z, kld
+
+
 def KLD(mean, log_std):
     """
     Calculates the Kullback-Leibler divergence of given distributions to unit Gaussians over the last dimension.